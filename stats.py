@@ -11,13 +11,215 @@ Process nginx logfiles and extract basic statistics.
 
 import ipwhois
 import os
-import dateutil.parser
+import dataclasses
+import datetime
+import functools
+import gzip
 import itertools
 import sys
-import importlib as imp
+import importlib
+import ipaddress
 import collections
+import concurrent.futures
+import csv
 import pycountry
 import pickle
+import re
+import threading
+import time
+
+
+MONTHS = {
+    m: i
+    for i, m in enumerate(
+        (
+            'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+            'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec',
+        ),
+        start = 1,
+    )
+}
+
+
+@functools.cache
+def timezone(offset):
+    """
+    Timezone from an UTC offset string, e.g. ``+0200``.
+    """
+
+    minutes = int(offset[1:3]) * 60 + int(offset[3:5])
+    minutes = -minutes if offset[0] == '-' else minutes
+
+    return datetime.timezone(datetime.timedelta(minutes = minutes))
+
+
+def nginx_time(timestamp, offset):
+    """
+    Parses an nginx timestamp.
+
+    The format is fixed, hence the fields are sliced at known positions,
+    which is much faster than a generic date parser.
+
+    Args:
+        timestamp:
+            Date and time, e.g. ``10/Oct/2023:13:55:36``.
+        offset:
+            UTC offset, e.g. ``+0200``.
+    """
+
+    return datetime.datetime(
+        int(timestamp[7:11]),
+        MONTHS[timestamp[3:6]],
+        int(timestamp[0:2]),
+        int(timestamp[12:14]),
+        int(timestamp[15:17]),
+        int(timestamp[18:20]),
+        tzinfo = timezone(offset),
+    )
+
+
+@functools.cache
+def country_names():
+    """
+    Country names by their 2 letter codes.
+    """
+
+    return {c.alpha_2: c.name for c in pycountry.countries}
+
+
+def display_name(names):
+    """
+    Network name as a single line string, from the first whois name.
+    """
+
+    if names:
+
+        return ', '.join(map(str, names[0])).replace('\n', ', ')
+
+
+@dataclasses.dataclass(slots = True)
+class LogEntry:
+    """
+    One entry of the log, optionally extended with whois data.
+    """
+
+    ip: str
+    req_url: str
+    http_code: int | None
+    page: str
+    from_url: str
+    useragent: str
+    time: datetime.datetime | None = None
+    country: str | None = None
+    names: list[tuple] | None = None
+    display_name: str | None = None
+
+
+    def add_whois(self, whois):
+        """
+        Extends the entry with a whois record.
+        """
+
+        self.country = whois['country']
+        self.names = whois['names']
+        self.display_name = whois['display_name']
+
+
+    def __getitem__(self, key):
+        """
+        Mapping style access to the fields, as log entries used to be dicts.
+        """
+
+        if key not in LOGENTRY_FIELDS:
+
+            raise KeyError(key)
+
+        return getattr(self, key)
+
+
+    def __contains__(self, key):
+
+        return key in LOGENTRY_FIELDS
+
+
+    def get(self, key, default = None):
+
+        return getattr(self, key) if key in LOGENTRY_FIELDS else default
+
+
+LOGENTRY_FIELDS = frozenset(f.name for f in dataclasses.fields(LogEntry))
+
+
+def readfile(fname):
+    """
+    Reads file, yields the fields of each line.
+
+    Fields are separated by spaces, double quoted fields may contain
+    spaces. The tokenization is done by the C implemented ``csv`` module.
+    The file is streamed, only one line is held in memory at a time.
+    """
+
+    with open(fname, 'r', newline = '') as f:
+
+        yield from csv.reader(f, delimiter = ' ', quotechar = '"')
+
+
+def parseline(l, parse_time = False):
+    """
+    Processes one line of the log into a tuple of ``LogEntry`` fields.
+    """
+
+    return (
+        l[0],
+        l[1],
+        int(l[6]) if l[6].isdigit() else None,
+        l[5],
+        l[8],
+        l[9],
+        nginx_time(l[3][1:], l[4][:-1]) if parse_time else None,
+    )
+
+
+def iter_logfile(fname, parse_time = False, domain_whitelist = None):
+    """
+    Reads and processes one log file, line by line.
+
+    Args:
+        fname:
+            Path to the log file.
+        parse_time:
+            Parse the timestamps of the log entries.
+        domain_whitelist:
+            Include only the entries of these domains.
+
+    Yields:
+        Tuples of ``LogEntry`` fields.
+    """
+
+    lines = readfile(fname)
+
+    if domain_whitelist is not None:
+
+        lines = (l for l in lines if l[1] in domain_whitelist)
+
+    for l in lines:
+
+        yield parseline(l, parse_time = parse_time)
+
+
+def parse_logfile(fname, parse_time = False, domain_whitelist = None):
+    """
+    Reads and processes one log file in a worker process.
+
+    Module level function, so it can be sent to worker processes. Returns
+    plain tuples, as these are much cheaper to pickle than ``LogEntry``
+    objects. Arguments are the same as for ``iter_logfile``.
+
+    Returns:
+        List of tuples of ``LogEntry`` fields.
+    """
+
+    return list(iter_logfile(fname, parse_time, domain_whitelist))
 
 
 class WebStats(object):
@@ -25,12 +227,19 @@ class WebStats(object):
     whois_cachefile = 'whois.pickle'
     WHOIS_CACHE  = {}
     WHOIS_FAILED = set()
-    last_failed  = None
+    WHOIS_NETS   = {}
+    # retries of rate limited lookups, waiting 5, 10, 20... seconds between
+    whois_rate_limit_retries = 3
+    whois_rate_limit_wait = 5
+    _whois_lock  = threading.Lock()
+    # networks broader than these are not used to reuse whois results
+    whois_net_min_prefixlen = {4: 24, 6: 48}
 
     def __init__(
         self,
         logdir,
-        domain_filter = lambda x: x,
+        domain_filter = None,
+        domain_whitelist = None,
         logfiles_domain = None,
         outdir = None,
         bot_keywords = {
@@ -51,6 +260,9 @@ class WebStats(object):
             'forschung',
             'hospital',
         },
+        whois_workers = 4,
+        parse_time = False,
+        nproc = 1,
     ):
         """
         Process nginx logfiles and extract basic statistics.
@@ -60,7 +272,15 @@ class WebStats(object):
                 Look up Nginx logfiles from this directory.
             domain_filter:
                 A function with value corresponding to False or True for
-                domains to be excluded or included, respectively.
+                domains to be excluded or included, respectively. It is
+                called with ``LogEntry`` objects, which support attribute
+                access and the dict style ``d['req_url']``, ``d.get(...)``
+                and ``'req_url' in d``. All fields are always present,
+                unset ones are None.
+            domain_whitelist:
+                A set of domains: only the log entries of these domains will
+                be included. Checked on the raw log lines, before
+                ``domain_filter``, which is much faster than a function.
             logfiles_domain:
                 From ``logdir`` use only the log files that belong to this
                 domain.
@@ -69,21 +289,38 @@ class WebStats(object):
                 from bots will be removed.
             ac_keywords:
                 Keywords to identify academic institutions.
+            whois_workers:
+                Number of threads performing whois lookups in parallel.
+            parse_time:
+                Parse the timestamps of the log entries into the ``time``
+                field, and sort the entries by time. The statistics do not
+                use the time, hence by default it is skipped.
+            nproc:
+                Number of processes reading the log files in parallel. The
+                default 1 disables multiprocessing and streams the files.
+                Workers hold each file in memory, and sending the entries
+                back costs a significant fraction of parsing them: measure
+                whether more processes pay off on the given machine.
         """
 
         self.logdir = logdir
         self.outdir = outdir or f'{self.logdir}-stats'
         self.domain_filter = domain_filter
+        self.domain_whitelist = domain_whitelist
         self.logfiles_domain = logfiles_domain
         self.bot_keywords = bot_keywords
         self.ac_keywords  = ac_keywords
+        self.whois_workers = whois_workers
+        self.parse_time = parse_time
+        self.nproc = nproc
+        self._iso2name = country_names()
 
 
     def reload(self):
 
         modname = self.__class__.__module__
         mod = __import__(modname, fromlist = [modname.split('.')[0]])
-        imp.reload(mod)
+        importlib.reload(mod)
         new = getattr(mod, self.__class__.__name__)
         setattr(self, '__class__', new)
 
@@ -95,7 +332,11 @@ class WebStats(object):
         self.read_logfiles()
         self.collect_whois()
         self.remove_failed()
-        self.sort_by_date()
+
+        if self.parse_time:
+
+            self.sort_by_date()
+
         self.stats()
         self.export('full')
         self.remove_bots()
@@ -107,12 +348,35 @@ class WebStats(object):
 
 
     def read_whois_cache(self):
+        """
+        Loads the whois cache, either gzip compressed or plain pickle.
+        """
 
         if os.path.exists(self.whois_cachefile):
 
-            self.WHOIS_CACHE, self.WHOIS_FAILED = pickle.load(
-                open(self.whois_cachefile, 'rb')
-            )
+            with open(self.whois_cachefile, 'rb') as fp:
+
+                gzipped = fp.read(2) == b'\x1f\x8b'
+
+            _open = gzip.open if gzipped else open
+
+            with _open(self.whois_cachefile, 'rb') as fp:
+
+                cache = pickle.load(fp)
+
+            self.WHOIS_CACHE, self.WHOIS_FAILED = cache[:2]
+
+            for this_whois in self.WHOIS_CACHE.values():
+
+                if 'display_name' not in this_whois:
+
+                    this_whois['display_name'] = display_name(
+                        this_whois['names']
+                    )
+
+            if len(cache) > 2:
+
+                self.WHOIS_NETS = cache[2]
 
 
     def output_toplist(self, fname, cntr):
@@ -120,179 +384,214 @@ class WebStats(object):
         Outputs a toplist from a Counter.
         """
 
-        rev_sorted = reversed(
-            sorted(
-                cntr.items(),
-                key = lambda i: i[1]
-            )
-        )
-
         with open(fname, 'w') as f:
 
-            _ = f.write(
-                '\n'.join(
-                    '%s\t%u' % i
-                    for i in rev_sorted
-                )
+            f.writelines(
+                '%s\t%u\n' % i
+                for i in cntr.most_common()
             )
 
 
-    def processline(self, l):
+    def whois_ip(self, ip):
         """
-        Processes one line of the log.
+        Looks up one IP address in the whois database.
+
+        The result is stored in ``WHOIS_CACHE``, or the address is added to
+        ``WHOIS_FAILED`` if the lookup failed. If the address belongs to a
+        network known from an earlier lookup, the result of that lookup is
+        used. Rate limited lookups are retried with increasing waits; if the
+        limit persists, the address is left for the next run, it is not
+        added to ``WHOIS_FAILED``. Safe to call from multiple threads.
         """
 
-        return {
-            'ip': l[0],
-            'req_url': l[1],
-            'time': dateutil.parser.parse(
-                '%s %s' % (l[3][1:], l[4][:-1]),
-                fuzzy = True
-            ),
-            'http_code': int(l[6]) if l[6].isdigit() else None,
-            'page': l[5],
-            'from_url': l[8],
-            'useragent': l[9]
+        this_whois = self.whois_net(ip)
+
+        if this_whois is not None:
+
+            with self._whois_lock:
+                self.WHOIS_CACHE[ip] = this_whois
+
+            return
+
+        for attempt in range(self.whois_rate_limit_retries + 1):
+
+            try:
+                ipw = ipwhois.IPWhois(ip)
+                res = ipw.lookup_whois(retry_count = 5)
+                break
+
+            except (ipwhois.exceptions.HTTPRateLimitError,
+                    ipwhois.exceptions.WhoisRateLimitError):
+
+                if attempt == self.whois_rate_limit_retries:
+
+                    sys.stdout.write('\t[WHOIS] %s [RATE LIMITED]\n' % ip)
+                    return
+
+                time.sleep(self.whois_rate_limit_wait * 2 ** attempt)
+
+            except (ipwhois.exceptions.BaseIpwhoisException, ValueError):
+                # includes private and reserved addresses and malformed
+                # IP fields, so one bad address does not stop the others
+                sys.stdout.write('\t[WHOIS] %s [FAILED]\n' % ip)
+
+                with self._whois_lock:
+                    self.WHOIS_FAILED.add(ip)
+
+                return
+
+        this_whois = {
+            'country': res['asn_country_code'],
+            'names': [
+                (e['name'], e['description'], e['city'], e['country'])
+                for e in res['nets']
+            ],
         }
+        this_whois['display_name'] = display_name(this_whois['names'])
+        sys.stdout.write('\t[WHOIS] %s\n' % ip)
+        net = self.smallest_net(ip, res['nets'])
 
+        with self._whois_lock:
+            self.WHOIS_CACHE[ip] = this_whois
 
-    def whoislookup(self, l):
+            if net is not None:
+
+                self.WHOIS_NETS[net] = this_whois
+
+
+    def whois_net(self, ip):
         """
-        Extends one data point with whois data.
+        Looks up an IP address in the networks of earlier whois results.
+
+        Returns the whois record of the smallest known network containing
+        the address, or None.
         """
 
-        if '_whois_done' in l and l['_whois_done']:
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
             return None
 
-        this_whois = {'country': None,
-                    'names': [(None, None, None, None)],
-                    '_whois_done': False}
+        for prefixlen in range(
+            addr.max_prefixlen,
+            self.whois_net_min_prefixlen[addr.version] - 1,
+            -1,
+        ):
 
-        if l['ip'] in self.WHOIS_CACHE:
-            this_whois = self.WHOIS_CACHE[l['ip']]
-        elif l['ip'] in self.WHOIS_FAILED:
-            return
+            net = ipaddress.ip_network((addr, prefixlen), strict = False)
 
-        else:
-            sys.stdout.write('\t[WHOIS] %s' % l['ip'])
+            if net in self.WHOIS_NETS:
 
-            try:
-                ipw = ipwhois.IPWhois(l['ip'])
-                res = ipw.lookup_whois(retry_count = 5)
-                this_whois['country'] = res['asn_country_code']
-                this_whois['names'] = [
-                    (e['name'], e['description'], e['city'], e['country'])
-                    for e in res['nets']
-                ]
-                sys.stdout.write('\n')
-                this_whois['_whois_done'] = True
-                self.WHOIS_CACHE[l['ip']] = this_whois
-            except (ipwhois.exceptions.HTTPLookupError,
-                    ipwhois.exceptions.HTTPRateLimitError,
-                    ipwhois.exceptions.WhoisLookupError):
-                sys.stdout.write(' [FAILED]\n')
-                self.WHOIS_FAILED.add(l['ip'])
-                self.last_failed = l['ip']
-
-        l.update(this_whois)
-
-
-    def countries(self, data):
+                return self.WHOIS_NETS[net]
+
+
+    def smallest_net(self, ip, nets):
+        """
+        From the networks of a whois result, selects the smallest one
+        containing the address.
+
+        Returns None if there is no such network, or it is broader than
+        ``whois_net_min_prefixlen``.
+        """
+
+        addr = ipaddress.ip_address(ip)
+        candidates = []
+
+        for e in nets:
+
+            for cidr in (e.get('cidr') or '').split(','):
+
+                try:
+                    net = ipaddress.ip_network(cidr.strip(), strict = False)
+                except ValueError:
+                    continue
+
+                if addr in net:
+
+                    candidates.append(net)
+
+        net = max(candidates, key = lambda n: n.prefixlen, default = None)
+
+        if (
+            net is not None and
+            net.prefixlen >= self.whois_net_min_prefixlen[net.version]
+        ):
+
+            return net
+
+
+    @staticmethod
+    def per_ip(data):
+        """
+        Counts the entries of each IP and selects the first entry of each IP.
+
+        Whois data belongs to IP addresses, hence the first entry of an IP
+        represents all its entries in the counts by country and by name.
+
+        Returns:
+            Tuple of two dicts, with the number of entries and the first
+            entry by IP.
+        """
+
+        entries_by_ip = {}
+        first_by_ip = {}
+
+        for d in data:
+
+            ip = d.ip
+
+            if ip in entries_by_ip:
+
+                entries_by_ip[ip] += 1
+
+            else:
+
+                entries_by_ip[ip] = 1
+                first_by_ip[ip] = d
+
+        return entries_by_ip, first_by_ip
+
+
+    def countries(self, data = None, ip_summary = None):
         """
         Return counts for each country.
         Maps country 2 letter codes to full names.
+
+        :param tuple ip_summary: The output of ``per_ip``, if already
+            available; then ``data`` is not needed.
         """
 
-        allcountr = set(map(lambda c: c.alpha_2, list(pycountry.countries)))
-
-        return \
-            collections.Counter(
-                map(
-                    lambda d:
-                        pycountry.countries.lookup(d[0]).name,
-                    set(
-                        map(
-                            lambda d:
-                                (
-                                    d['country'],
-                                    d['ip']
-                                ),
-                            filter(
-                                lambda d:
-                                    'country' in d and d['country'] in allcountr,
-                                data
-                            )
-                        )
-                    )
-                )
-            )
+        _, first_by_ip = ip_summary or self.per_ip(data)
+
+        return collections.Counter(
+            self._iso2name[d.country]
+            for d in first_by_ip.values()
+            if d.country in self._iso2name
+        )
 
 
-    def names(self, data, unique = False):
+    def names(self, data = None, unique = False, ip_summary = None):
         """
         Counts per organization/network name.
 
         E.g. one name is `GoogleBot`, another is `Cambridge University`, etc.
 
         :param bool unique: Count only once repeated IPs.
+        :param tuple ip_summary: The output of ``per_ip``, if already
+            available; then ``data`` is not needed.
         """
 
-        lst = \
-            map(
-                lambda d:
-                    (
-                        (', '.join(
-                            map(str, d['names'][0])
-                        )).replace('\n', ', '),
-                        d['ip']
-                    ),
-                filter(
-                    lambda d:
-                        'names' in d and len(d['names']),
-                    data
-                )
-            )
+        entries_by_ip, first_by_ip = ip_summary or self.per_ip(data)
+        counts = collections.Counter()
 
-        if unique: lst = set(lst)
+        for ip, d in first_by_ip.items():
 
-        return \
-            collections.Counter(
-                map(
-                    lambda d:
-                        d[0],
-                    lst
-                )
-            )
+            if d.display_name:
 
+                counts[d.display_name] += 1 if unique else entries_by_ip[ip]
 
-    def readfile(self, fname):
-        """
-        Reads file, returns list of lines.
-        """
+        return counts
 
-        with open(fname, 'r') as f:
-            out = []
-            in_q = False
-            line = []
-            field = []
-            for c in f.read():
-                if c == '"':
-                    in_q = not in_q
-                elif c == '\n':
-                    if not in_q:
-                        line.append(''.join(field))
-                        field = []
-                        out.append(line)
-                        line = []
-                elif c == ' ' and not in_q:
-                    line.append(''.join(field))
-                    field = []
-                else:
-                    field.append(c)
-        if len(line):
-            line.append(''.join(field))
-            out.append(line)
-        return out
 
     def logfiles_lookup(self):
 
@@ -309,86 +608,157 @@ class WebStats(object):
 
     def read_logfiles(self):
 
-        self.data = \
-            list(
-                filter(
-                    self.domain_filter,
-                    itertools.chain(
-                        *map(
-                            lambda logf:
-                                map(
-                                    self.processline,
-                                    self.readfile(logf)
-                                ),
-                            self.logs
-                        )
-                    )
-                )
-            )
+        args = {
+            'parse_time': self.parse_time,
+            'domain_whitelist': self.domain_whitelist,
+        }
 
+        if self.nproc > 1 and len(self.logs) > 1:
 
-    def remove_failed(self):
+            nproc = min(self.nproc, len(self.logs))
+            parse = functools.partial(parse_logfile, **args)
 
-        self.data = [d for d in self.data if '_whois_done' in d]
+            with concurrent.futures.ProcessPoolExecutor(nproc) as executor:
 
+                per_file = list(executor.map(parse, self.logs))
 
-    @staticmethod
-    def inspect_name(n, kws):
+        else:
 
-        for n0 in n:
+            # streamed: no file is held in memory as a whole
+            per_file = map(functools.partial(iter_logfile, **args), self.logs)
 
-            if not n0:
-                continue
+        entries = itertools.starmap(
+            LogEntry,
+            itertools.chain.from_iterable(per_file),
+        )
 
-            for n1 in n0:
+        if self.domain_filter is not None:
 
-                if not n1:
-                    continue
+            entries = filter(self.domain_filter, entries)
+
+        self.data = list(entries)
+
+
+    def remove_failed(self):
 
-                if any(b in n1 or b in n1.lower() for b in kws):
+        self.data = [d for d in self.data if d.names is not None]
 
-                    return True
 
-        return False
+    @staticmethod
+    def keywords_regex(kws):
+        """
+        Compiles a set of keywords into one regex matching any of them.
+        """
+
+        return re.compile('|'.join(map(re.escape, kws)) or '(?!)')
+
+
+    @staticmethod
+    def inspect_name(n, regex):
+        """
+        Tells if any of the whois names matches the keywords regex, either
+        as it is or in lower case.
+        """
+
+        return any(
+            regex.search(n1) or regex.search(n1.lower())
+            for n0 in n
+            if n0
+            for n1 in n0
+            if n1
+        )
+
 
     def remove_bots(self):
 
+        bot_re = self.keywords_regex(self.bot_keywords)
+
         def is_bot(n):
 
-            return self.inspect_name(n, self.bot_keywords)
+            return self.inspect_name(n, bot_re)
 
-        self.data = [d for d in self.data if not is_bot(d['names'])]
+        self.data = [d for d in self.data if not is_bot(d.names)]
 
 
     def select_ac(self):
 
+        ac_re = self.keywords_regex(self.ac_keywords)
+
         def is_ac(n):
 
-            return self.inspect_name(n, self.ac_keywords)
+            return self.inspect_name(n, ac_re)
 
-        self.data = [d for d in self.data if is_ac(d['names'])]
+        self.data = [d for d in self.data if is_ac(d.names)]
 
 
     def collect_whois(self):
+        """
+        Looks up each new IP address once, in parallel threads, and extends
+        the data points with the whois data.
+        """
+
+        by_ip = {}
+
+        for d in self.data:
+
+            by_ip.setdefault(d.ip, []).append(d)
+
+        ips = by_ip.keys() - self.WHOIS_CACHE.keys() - self.WHOIS_FAILED
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers = self.whois_workers,
+        )
 
         try:
 
-            _ = list(map(self.whoislookup, self.data))
+            _ = list(executor.map(self.whois_ip, ips))
 
         except:
 
-            self.WHOIS_FAILED.discard(self.last_failed)
+            # interrupted: keep the results so far
+            executor.shutdown(cancel_futures = True)
+            self.save_whois_cache()
+
+        finally:
+
+            executor.shutdown()
+
+        for ip, entries in by_ip.items():
 
-            with open(self.whois_cachefile, 'wb') as fp:
+            if ip in self.WHOIS_CACHE:
 
-                pickle.dump((self.WHOIS_CACHE, self.WHOIS_FAILED), fp)
+                this_whois = self.WHOIS_CACHE[ip]
+
+                for d in entries:
+
+                    d.add_whois(this_whois)
+
+
+    def save_whois_cache(self):
+
+        with gzip.open(self.whois_cachefile, 'wb', compresslevel = 3) as fp:
+
+            pickle.dump(
+                (self.WHOIS_CACHE, self.WHOIS_FAILED, self.WHOIS_NETS),
+                fp,
+                protocol = pickle.HIGHEST_PROTOCOL,
+            )
 
 
     def stats(self):
+        """
+        Counts visitors by country and by network name.
+
+        The data is traversed only once, the counts are derived from the
+        per IP summary.
+        """
 
-        self.visitors_by_country = self.countries(self.data)
-        self.visitors_by_name = self.names(self.data)
-        self.visitors_by_name_unique = self.names(self.data, unique = True)
+        ip_summary = self.per_ip(self.data)
+        self.visitors_by_country = self.countries(ip_summary = ip_summary)
+        self.visitors_by_name = self.names(ip_summary = ip_summary)
+        self.visitors_by_name_unique = self.names(
+            unique = True,
+            ip_summary = ip_summary,
+        )
 
 
     def export(self, label: str = 'full'):
@@ -401,11 +771,9 @@ class WebStats(object):
             fname = os.path.join(self.outdir, f'{attr}__{label}')
             self.output_toplist(fname, getattr(self, attr))
 
-        with open(self.whois_cachefile, 'wb') as fp:
-
-            pickle.dump((self.WHOIS_CACHE, self.WHOIS_FAILED), fp)
+        self.save_whois_cache()
 
 
     def sort_by_date(self):
 
-        self.data = sorted(self.data, key = lambda x: x.get('time'))
+        self.data = sorted(self.data, key = lambda x: x.time)